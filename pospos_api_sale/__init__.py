@@ -1,38 +1,63 @@
 import os
+import math
 import time
 import logging
-from datetime import datetime
-from flask import Flask, jsonify, request, Blueprint
+from flask import Flask, Response, request, Blueprint, current_app
 from flask_cors import CORS
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import orjson
+import ijson
+import queue
 import threading
+from dataclasses import dataclass, replace
+from operator import itemgetter
 from typing import Optional
 
 
-# Application factory (simple instantiation for this project)
-app = Flask(__name__)
-CORS(app)
-app.url_map.strict_slashes = False
-
-
 # Basic logging to stdout
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("POSPOS_API_SALE")
 
 
-# Log every outgoing response (status and body) for debugging
-@app.after_request
+# Response body logging is opt-in (LOG_BODIES=1) and capped at LOG_BODY_MAX bytes
+def _resolve_log_body_max():
+    try:
+        val = int(str(os.getenv("LOG_BODY_MAX", "512")).strip())
+        return 512 if val <= 0 else val
+    except Exception:
+        return 512
+
+LOG_BODIES = os.getenv("LOG_BODIES", "0").strip() == "1"
+LOG_BODY_MAX = _resolve_log_body_max()
+
+
+def _response_body_preview(response) -> str:
+    length = response.content_length
+    if length is not None and length > LOG_BODY_MAX:
+        return f"<{length} bytes>"
+    try:
+        raw = response.get_data(as_text=False)
+    except Exception:
+        return "<unreadable>"
+    preview = raw[:LOG_BODY_MAX].decode("utf-8", "replace")
+    if len(raw) > LOG_BODY_MAX:
+        preview += "...(truncated)"
+    return preview
+
+
+# Log every outgoing response (status, and body when enabled) for debugging
 def log_response(response):
+    # Skip all path/body formatting when INFO is not going to be emitted
+    if not current_app.logger.isEnabledFor(logging.INFO):
+        return response
     try:
         content_type = response.headers.get("Content-Type", "")
-        try:
-            body_text = response.get_data(as_text=True)
-        except Exception:
-            body_text = "<unreadable>"
-        if body_text and len(body_text) > 4000:
-            body_text = body_text[:4000] + "...(truncated)"
-        app.logger.info(
+        if LOG_BODIES:
+            body_text = _response_body_preview(response)
+        else:
+            body_text = f"<{response.content_length} bytes>"
+        current_app.logger.info(
             "Response %s %s -> %s | Content-Type=%s | Body=%s",
             request.method,
             request.full_path if request.query_string else request.path,
@@ -41,25 +66,46 @@ def log_response(response):
             body_text,
         )
     except Exception as exc:  # pragma: no cover
-        app.logger.warning("Failed to log response: %s", exc)
+        current_app.logger.warning("Failed to log response: %s", exc)
     return response
 
 
-# Simulated processing delay for all routes (1 second)
-@app.before_request
+# Optional simulated processing delay for all routes (opt-in for local testing).
+# Set SIMULATE_DELAY_MS to a positive number of milliseconds to enable.
+def _resolve_simulated_delay_seconds():
+    try:
+        val = float(str(os.getenv("SIMULATE_DELAY_MS", "0")).strip())
+        return val / 1000.0 if val > 0 else 0.0
+    except Exception:
+        return 0.0
+
+SIMULATED_DELAY_SECONDS = _resolve_simulated_delay_seconds()
+
+
 def add_processing_delay():
-    time.sleep(1)
+    time.sleep(SIMULATED_DELAY_SECONDS)
+
+
+# In-memory state to emulate order lifecycle and passthrough.
+# Shared between request threads and the async /cashin worker; always access under _state_lock.
+@dataclass
+class OrderState:
+    amount: float = 0.0
+    cancelled: bool = False
+    created_at: float = 0.0
+    cashin_ack: bool = False
+    cashin_baht: float = 0.0
 
 
-# In-memory state to emulate order lifecycle and passthrough
-order_amount = 0.0
-is_cancelled = False
-last_order_created_at = 0.0
-cashin_ack_received = False
-last_cashin_received_baht = 0.0
+_state_lock = threading.Lock()
+_state = OrderState()
 
 # Upstream base API (configurable)
 UPSTREAM_BASE = os.getenv("UPSTREAM_BASE", "http://192.168.1.33:5000")
+_URL_INVENTORY = f"{UPSTREAM_BASE}/inventory"
+_URL_LATEST = f"{UPSTREAM_BASE}/socket/latest"
+_URL_CASHIN = f"{UPSTREAM_BASE}/cashin"
+_URL_CANCEL = f"{UPSTREAM_BASE}/cashin_cancel"
 
 # Global HTTP timeout (seconds) applied to all outbound API calls.
 # Default is 300 seconds; configurable via HTTP_TIMEOUT_SECONDS environment variable.
@@ -75,13 +121,51 @@ def _resolve_global_http_timeout():
 
 HTTP_TIMEOUT_SECONDS = _resolve_global_http_timeout()
 
+# Shared HTTP session so upstream calls reuse keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=0))
+_SESSION.headers["Connection"] = "keep-alive"
+
+
+# Generic response templates are static; parse them once at import time
+_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "generic")
+
+
+def _read_templates(template_dir: str) -> dict:
+    templates = {}
+    for filename in os.listdir(template_dir):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(template_dir, filename), "rb") as f:
+            templates[filename] = orjson.loads(f.read())
+    return templates
+
+
+_TEMPLATES = _read_templates(_TEMPLATE_DIR)
+
+
+_CREATE_SALE_TMPL = _TEMPLATES["create-sale-success.json"]
+_STATUS_TMPL = _TEMPLATES["get-by-id-success.json"]
+_CANCEL_TMPL = _TEMPLATES["cancel-sale-success.json"]
+
+
+# Response factories: static keys come from the cached templates, only the
+# per-request fields are filled in (templates themselves are never mutated).
+def _create_sale_response(amount: int, status: str) -> dict:
+    return {**_CREATE_SALE_TMPL, "data": {**_CREATE_SALE_TMPL["data"], "amount": amount, "status": status}}
+
+
+def _status_response(amount: int, cashin: int, status: str) -> dict:
+    return {**_STATUS_TMPL, "data": {**_STATUS_TMPL["data"], "amount": amount, "cashin": cashin, "status": status}}
 
-def _load_generic_template(filename: str) -> dict:
-    template_path = os.path.join(
-        os.path.dirname(__file__), "templates", "generic", filename
-    )
-    with open(template_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+
+def _cancel_response() -> dict:
+    return _CANCEL_TMPL
+
+
+def _json_response(data, status: int = 200) -> Response:
+    """Serialize ``data`` with orjson (faster than Flask's stdlib-based jsonify)."""
+    return Response(orjson.dumps(data), status=status, mimetype="application/json")
 
 
 def _get_inserted_amount_from_latest(latest: dict) -> float:
@@ -99,31 +183,32 @@ def _get_inserted_amount_from_latest(latest: dict) -> float:
         return 0.0
 
 
-@app.get("/")
+# Static health-check fields, pre-serialized once at import (trailing "}" dropped)
+_PORT = int(os.getenv("PORT", "5215"))
+_HEALTH_PREFIX = orjson.dumps({"message": "POSPOS_API_SALE is running (Flask)", "port": _PORT})[:-1]
+
+
 def health_check():
-    port = int(os.getenv("PORT", "5215"))
-    return jsonify(
-        {
-            "message": "POSPOS_API_SALE is running (Flask)",
-            "port": port,
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-        }
-    )
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()).encode()
+    return Response(_HEALTH_PREFIX + b',"timestamp":"' + timestamp + b'"}', mimetype="application/json")
 
 
 api_v1 = Blueprint("api_v1", __name__, url_prefix="/api/v1")
 
 
-def _safe_first_value(container, key):
-    try:
-        v = container.get(key)
-        if isinstance(v, list):
-            v = v[0] if v else None
-        if isinstance(v, dict):
-            v = v.get("value", v)
-        return v
-    except Exception:
-        return None
+def _as_number(x):
+    """Parse an upstream numeric field (int or numeric string); raises on bad input."""
+    if isinstance(x, int):
+        return x
+    if not isinstance(x, float):
+        try:
+            return int(x)
+        except ValueError:
+            x = float(x)
+    # reject inf/nan, which would otherwise leak into amounts and output rows
+    if not math.isfinite(x):
+        raise ValueError(f"non-finite number: {x!r}")
+    return x
 
 
 def _map_inventory_response(raw: dict) -> list:
@@ -149,60 +234,99 @@ def _map_inventory_response(raw: dict) -> list:
         if not isinstance(cash_list, list):
             return []
 
+        # fv_minor -> [qty, inStacker]; output dicts are built once after the loop
         denom_map = {}
 
-        def ensure_num(x, default=0):
-            try:
-                if x is None:
-                    return default
-                if isinstance(x, (int, float)):
-                    return x
-                s = str(x)
-                return float(s) if ("." in s) else int(s)
-            except Exception:
-                return default
-
         for cash in cash_list:
             if not isinstance(cash, dict):
                 continue
-            cash_type = str(cash.get("type")) if cash.get("type") is not None else None
+            cash_type = cash.get("type")
+            cash_type = str(cash_type) if cash_type is not None else None
+            # type 3 = changeable (dispensable) -> qty, type 4 = total in stacker -> inStacker
+            slot = 0 if cash_type == "3" else (1 if cash_type == "4" else None)
             denoms = cash.get("Denomination")
             denoms = denoms if isinstance(denoms, list) else ([denoms] if isinstance(denoms, dict) else [])
             for dn in denoms:
                 if not isinstance(dn, dict):
                     continue
-                fv_minor = ensure_num(dn.get("fv"), default=None)
-                if fv_minor is None:
+                try:
+                    fv_minor = _as_number(dn["fv"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                counts = denom_map.get(fv_minor)
+                if counts is None:
+                    counts = denom_map[fv_minor] = [0, 0]
+                if slot is None:
                     continue
-                key = str(fv_minor)
-                piece_val = ensure_num(_safe_first_value(dn, "Piece"), 0)
-                # initialize entry
-                if key not in denom_map:
-                    value_baht = float(fv_minor) / 100.0
-                    # cast to int if whole number
-                    value_field = int(value_baht) if abs(value_baht - int(value_baht)) < 1e-9 else value_baht
-                    denom_map[key] = {
-                        "denom": f"{value_baht:.2f}",
-                        "value": value_field,
-                        "qty": 0,
-                        "inStacker": 0,
-                        "type": 1 if fv_minor >= 2000 else 2,
-                    }
-                if cash_type == "3":
-                    # type 3 = changeable (dispensable)
-                    denom_map[key]["qty"] += int(piece_val)
-                elif cash_type == "4":
-                    # type 4 = total in stacker
-                    denom_map[key]["inStacker"] += int(piece_val)
+                piece = dn.get("Piece")
+                if isinstance(piece, list):
+                    piece = piece[0] if piece else None
+                if isinstance(piece, dict):
+                    piece = piece.get("value")
+                try:
+                    counts[slot] += int(_as_number(piece))
+                except (TypeError, ValueError):
+                    pass
+
+        items = []
+        for fv_minor, (qty, in_stacker) in denom_map.items():
+            value_baht = fv_minor / 100.0
+            # cast to int if whole number
+            value_field = int(value_baht) if value_baht.is_integer() else value_baht
+            items.append(
+                {
+                    "denom": f"{value_baht:.2f}",
+                    "value": value_field,
+                    "qty": qty,
+                    "inStacker": in_stacker,
+                    "type": 1 if fv_minor >= 2000 else 2,
+                }
+            )
 
         # sort by value desc to keep output stable
-        items = list(denom_map.values())
-        items.sort(key=lambda x: (float(x.get("value", 0))), reverse=True)
+        items.sort(key=itemgetter("value"), reverse=True)
         return items
     except Exception:
         return []
 
 
+def _cash_satang(cash) -> int:
+    """Sum fv (satang) * sum(Piece[].value) over one /cashin Cash entry of type "1"."""
+    try:
+        # Only accept Cash of type "1" (per requirement/example)
+        cash_type = cash.get("type")
+        if cash_type is not None and str(cash_type) != "1":
+            return 0
+        denoms = cash["Denomination"]
+    except (AttributeError, KeyError):
+        return 0
+    # Denomination (and Piece) may be a single object instead of a list
+    if isinstance(denoms, dict):
+        denoms = [denoms]
+    elif not isinstance(denoms, list):
+        return 0
+    total_satang = 0
+    for dn in denoms:
+        try:
+            fv_minor = _as_number(dn["fv"])
+            pieces = dn["Piece"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if isinstance(pieces, dict):
+            pieces = [pieces]
+        elif not isinstance(pieces, list):
+            continue
+        # A bad or missing Piece value only skips that piece, never the denomination
+        piece_sum = 0
+        for p in pieces:
+            try:
+                piece_sum += int(p.get("value") or 0)
+            except (AttributeError, TypeError, ValueError):
+                continue
+        total_satang += fv_minor * piece_sum
+    return total_satang
+
+
 def _extract_cashin_amount_baht(raw: dict) -> float:
     """Extract accepted cash amount (THB) from REST_API_CI /cashin response.
 
@@ -211,169 +335,278 @@ def _extract_cashin_amount_baht(raw: dict) -> float:
     The value is satang; divide by 100 to get THB.
     """
     try:
-        if not isinstance(raw, dict):
-            return 0.0
-        response = raw.get("response")
-        if not isinstance(response, dict):
-            return 0.0
-        change_response_root = response.get("change_response")
-        if not isinstance(change_response_root, dict):
-            return 0.0
-        body_list = change_response_root.get("Body")
-        if not isinstance(body_list, list) or not body_list:
-            return 0.0
-        body0 = body_list[0] if isinstance(body_list[0], dict) else None
-        if not body0:
-            return 0.0
-        change_resp_list = body0.get("ChangeResponse")
-        if not isinstance(change_resp_list, list) or not change_resp_list:
-            return 0.0
-        change0 = change_resp_list[0] if isinstance(change_resp_list[0], dict) else None
-        if not change0:
-            return 0.0
+        change0 = raw["response"]["change_response"]["Body"][0]["ChangeResponse"][0]
 
         # Preferred: compute from Cash[].Denomination[]. (fv in satang) * sum(Piece[].value)
-        total_satang = 0.0
-        cash_list = change0.get("Cash")
-        if isinstance(cash_list, list) and cash_list:
-            for cash in cash_list:
-                if not isinstance(cash, dict):
-                    continue
-                # Only accept Cash of type "1" (per requirement/example)
-                cash_type = cash.get("type")
-                if cash_type is not None and str(cash_type) != "1":
-                    continue
-                denoms = cash.get("Denomination")
-                # normalize to list
-                if isinstance(denoms, dict):
-                    denoms = [denoms]
-                if not isinstance(denoms, list):
-                    continue
-                for dn in denoms:
-                    if not isinstance(dn, dict):
-                        continue
-                    fv_str = dn.get("fv")
-                    try:
-                        fv_minor = float(fv_str) if fv_str is not None and "." in str(fv_str) else int(str(fv_str))
-                    except Exception:
-                        continue
-                    piece_items = dn.get("Piece")
-                    piece_sum = 0
-                    if isinstance(piece_items, list):
-                        for p in piece_items:
-                            if isinstance(p, dict):
-                                try:
-                                    pv = p.get("value")
-                                    piece_sum += int(str(pv)) if pv is not None else 0
-                                except Exception:
-                                    continue
-                    elif isinstance(piece_items, dict):
-                        try:
-                            pv = piece_items.get("value")
-                            piece_sum += int(str(pv)) if pv is not None else 0
-                        except Exception:
-                            piece_sum += 0
-                    # accumulate
-                    total_satang += float(fv_minor) * float(piece_sum)
-
+        # Accumulate in integer satang and convert to THB once at the end
+        total_satang = sum(_cash_satang(cash) for cash in change0.get("Cash") or ())
         if total_satang > 0:
-            return float(total_satang) / 100.0
+            return total_satang / 100.0
 
         # Fallback: Amount[0].value (satang)
-        amount_list = change0.get("Amount")
-        if isinstance(amount_list, list) and amount_list:
-            amount0 = amount_list[0]
-            raw_val = amount0.get("value") if isinstance(amount0, dict) else None
-            if raw_val is not None:
-                s = str(raw_val)
-                try:
-                    satang = float(s) if "." in s else int(s)
-                    return float(satang) / 100.0
-                except Exception:
-                    return 0.0
+        return _as_number(change0["Amount"][0]["value"]) / 100.0
+    except (AttributeError, KeyError, TypeError, IndexError, ValueError):
         return 0.0
+
+
+# /cashin responses larger than this are summed incrementally instead of parsed whole
+CASHIN_STREAM_THRESHOLD_BYTES = 64 * 1024
+# Position of ChangeResponse[0] as a path of object keys / array indices
+_CASHIN_CHANGE0_PATH = ["response", "change_response", "Body", 0, "ChangeResponse", 0]
+_CASHIN_CASH_LIST_PATH = _CASHIN_CHANGE0_PATH + ["Cash"]
+_CASHIN_AMOUNT0_VALUE_PATH = _CASHIN_CHANGE0_PATH + ["Amount", 0, "value"]
+
+
+def _stream_cashin_amount_baht(fileobj) -> float:
+    """Streaming variant of _extract_cashin_amount_baht for large bodies.
+
+    Makes one pass over ijson parse events, following only Body[0].ChangeResponse[0]
+    like the non-streaming path. Each Cash[] entry is built and summed on its own,
+    Amount[0].value is captured for the same fallback.
+    """
+    try:
+        path = []  # current position: object keys and array indices
+        total_satang = 0
+        amount_raw = None
+        builder = None  # ObjectBuilder for the Cash[] entry being read
+        depth = 0
+        for _prefix, event, value in ijson.parse(fileobj, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if event == "start_map" or event == "start_array":
+                    depth += 1
+                elif event == "end_map" or event == "end_array":
+                    depth -= 1
+                    if depth == 0:
+                        total_satang += _cash_satang(builder.value)
+                        builder = None
+                continue
+
+            if event == "map_key":
+                path[-1] = value
+                continue
+            if event == "end_map" or event == "end_array":
+                path.pop()
+                continue
+            # Any other event is a new value; advance the enclosing array's index
+            if path and isinstance(path[-1], int):
+                path[-1] += 1
+            if event == "start_map":
+                if path[:-1] == _CASHIN_CASH_LIST_PATH:
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                    depth = 1
+                else:
+                    path.append(None)
+            elif event == "start_array":
+                path.append(-1)
+            elif amount_raw is None and path == _CASHIN_AMOUNT0_VALUE_PATH:
+                amount_raw = value
+
+        if total_satang > 0:
+            return total_satang / 100.0
+        # Fallback: Amount[0].value (satang)
+        return _as_number(amount_raw) / 100.0
     except Exception:
         return 0.0
 
 
+def _content_length(resp) -> int:
+    try:
+        return int(resp.headers.get("Content-Length") or 0)
+    except ValueError:
+        return 0
+
+
 def _call_upstream_cashin(amount_value: float) -> None:
-    global cashin_ack_received, last_cashin_received_baht
     try:
-        url = f"{UPSTREAM_BASE}/cashin"
+        url = _URL_CASHIN
         payload = {"amount": amount_value}
         start_ts = time.time()
         logger.info("Calling upstream /cashin url=%s payload=%s", url, payload)
-        resp = requests.post(url, json=payload, timeout=HTTP_TIMEOUT_SECONDS)
-        duration_ms = (time.time() - start_ts) * 1000.0
-        content_type = resp.headers.get("Content-Type", "")
-        try:
-            body_text = resp.text
-            if body_text and len(body_text) > 2000:
-                body_text = body_text[:2000] + "...(truncated)"
-        except Exception:
-            body_text = "<unreadable>"
-
-        logger.info(
-            "Upstream /cashin responded status=%s duration_ms=%.1f content_type=%s body=%s",
-            resp.status_code,
-            duration_ms,
-            content_type,
-            body_text,
-        )
+        with _SESSION.post(url, json=payload, timeout=HTTP_TIMEOUT_SECONDS, stream=True) as resp:
+            duration_ms = (time.time() - start_ts) * 1000.0
+            content_type = resp.headers.get("Content-Type", "")
+            content_length = _content_length(resp)
+            streamed = resp.ok and content_length > CASHIN_STREAM_THRESHOLD_BYTES
+            if streamed:
+                raw_body = None
+                body_text = f"<{content_length} bytes, streamed>"
+            else:
+                # Decode raw bytes directly; resp.text may run charset detection on the whole body
+                raw_body = resp.content
+                body_text = raw_body[:2000].decode("utf-8", "replace")
+                if len(raw_body) > 2000:
+                    body_text += "...(truncated)"
+
+            logger.info(
+                "Upstream /cashin responded status=%s duration_ms=%.1f content_type=%s body=%s",
+                resp.status_code,
+                duration_ms,
+                content_type,
+                body_text,
+            )
+
+            if not resp.ok:
+                logger.warning("Upstream /cashin non-OK status: %s", resp.status_code)
+                return
 
-        if resp.ok:
             # Parse accepted amount from response JSON if possible
-            try:
-                resp_json = resp.json()
-            except Exception:
-                resp_json = None
-            if isinstance(resp_json, dict):
-                amount_baht = _extract_cashin_amount_baht(resp_json)
-                if amount_baht > 0:
-                    last_cashin_received_baht = amount_baht
-                    logger.info("Parsed cashin amount from upstream response: %s THB", amount_baht)
-            cashin_ack_received = True
-        else:
-            logger.warning("Upstream /cashin non-OK status: %s", resp.status_code)
+            if streamed:
+                resp.raw.decode_content = True
+                amount_baht = _stream_cashin_amount_baht(resp.raw)
+            else:
+                try:
+                    resp_json = orjson.loads(raw_body)
+                except Exception:
+                    resp_json = None
+                amount_baht = _extract_cashin_amount_baht(resp_json) if isinstance(resp_json, dict) else 0.0
+
+        with _state_lock:
+            if amount_baht > 0:
+                _state.cashin_baht = amount_baht
+            _state.cashin_ack = True
+        if amount_baht > 0:
+            logger.info("Parsed cashin amount from upstream response: %s THB", amount_baht)
     except Exception as exc:
         logger.warning("Upstream /cashin failed (async): %s", exc)
 
 
+# Bounded pool of daemon worker threads for async /cashin calls (size via CASHIN_POOL,
+# default 8). Workers are daemons, like the per-call threads they replace, so process
+# exit (e.g. gunicorn worker recycling) does not wait on in-flight /cashin calls;
+# those calls are abandoned. concurrent.futures is not used because its workers are
+# always joined at exit.
+def _resolve_cashin_pool_size():
+    try:
+        val = int(str(os.getenv("CASHIN_POOL", "8")).strip())
+        return 8 if val <= 0 else val
+    except Exception:
+        return 8
+
+CASHIN_POOL_SIZE = _resolve_cashin_pool_size()
+_cashin_queue = queue.SimpleQueue()
+_cashin_lock = threading.Lock()
+_cashin_pending = 0
+_cashin_workers = []
+
+
+def _cashin_worker() -> None:
+    global _cashin_pending
+    while True:
+        amount_value = _cashin_queue.get()
+        try:
+            _call_upstream_cashin(amount_value)
+        finally:
+            with _cashin_lock:
+                _cashin_pending -= 1
+
+
 def _submit_cashin_async(amount_value: float) -> None:
-    t = threading.Thread(target=_call_upstream_cashin, args=(amount_value,), daemon=True)
-    t.start()
+    global _cashin_pending
+    with _cashin_lock:
+        # Start workers on first use (no threads at import, safe for pre-fork servers)
+        if not _cashin_workers:
+            for i in range(CASHIN_POOL_SIZE):
+                t = threading.Thread(target=_cashin_worker, name=f"cashin-{i}", daemon=True)
+                t.start()
+                _cashin_workers.append(t)
+        _cashin_pending += 1
+        pending = _cashin_pending
+    if pending > CASHIN_POOL_SIZE:
+        logger.warning(
+            "Upstream /cashin queued: %d calls already in flight (CASHIN_POOL=%d)",
+            pending - 1,
+            CASHIN_POOL_SIZE,
+        )
+    _cashin_queue.put(amount_value)
+
+
+# Snapshot of upstream /socket/latest, refreshed by a background thread so that
+# /status polls read from memory instead of blocking on the upstream call.
+LATEST_REFRESH_INTERVAL_SECONDS = 0.2
+LATEST_REFRESH_TIMEOUT_SECONDS = min(HTTP_TIMEOUT_SECONDS, 5.0)
+# A snapshot older than this is treated as missing (upstream hung or unreachable)
+LATEST_MAX_AGE_SECONDS = LATEST_REFRESH_TIMEOUT_SECONDS + 5 * LATEST_REFRESH_INTERVAL_SECONDS
+_latest_lock = threading.Lock()
+_latest_payload = None
+_latest_fetched_at = 0.0
+_latest_refresher = None
+_latest_refresher_lock = threading.Lock()
+
+
+def _fetch_latest_once() -> None:
+    global _latest_payload, _latest_fetched_at
+    payload = None
+    try:
+        resp = _SESSION.get(_URL_LATEST, timeout=LATEST_REFRESH_TIMEOUT_SECONDS)
+        if resp.ok:
+            payload = orjson.loads(resp.content)
+    except Exception as exc:
+        logger.debug("Upstream /socket/latest refresh failed: %s", exc)
+    # A failed fetch clears the snapshot, as the old per-request call did
+    with _latest_lock:
+        _latest_payload = payload
+        _latest_fetched_at = time.monotonic()
+
+
+def _refresh_latest_loop() -> None:
+    while True:
+        time.sleep(LATEST_REFRESH_INTERVAL_SECONDS)
+        _fetch_latest_once()
+
+
+def _ensure_latest_refresher() -> None:
+    """Start the /socket/latest refresher on first use (no network at import).
+
+    The first snapshot is fetched synchronously so the first /status is not empty.
+    """
+    global _latest_refresher
+    if _latest_refresher is not None:
+        return
+    with _latest_refresher_lock:
+        if _latest_refresher is None:
+            _fetch_latest_once()
+            _latest_refresher = threading.Thread(
+                target=_refresh_latest_loop, name="latest-refresher", daemon=True
+            )
+            _latest_refresher.start()
+
+
+def _get_latest_snapshot():
+    """Return the latest /socket/latest payload, or None if missing or stale."""
+    with _latest_lock:
+        if time.monotonic() - _latest_fetched_at > LATEST_MAX_AGE_SECONDS:
+            return None
+        return _latest_payload
 
 
 @api_v1.get("/balances")
 def get_balances():
     try:
         # Call upstream inventory and map to generic shape
-        shaped = _load_generic_template("get-inventory-success.json")
+        # Read-only use of the cached template; "data" is replaced, never mutated
+        shaped = _TEMPLATES["get-inventory-success.json"]
         data_items = []
         try:
-            resp = requests.get(f"{UPSTREAM_BASE}/inventory", timeout=HTTP_TIMEOUT_SECONDS)
+            resp = _SESSION.get(_URL_INVENTORY, timeout=HTTP_TIMEOUT_SECONDS)
             if resp.ok:
-                upstream = resp.json()
+                upstream = orjson.loads(resp.content)
                 data_items = _map_inventory_response(upstream)
         except Exception as exc:
             logger.warning("Upstream /inventory failed: %s", exc)
 
         if data_items:
-            shaped["data"] = data_items
-        return jsonify(shaped)
+            shaped = {**shaped, "data": data_items}
+        return _json_response(shaped)
     except Exception as exc:  # pragma: no cover
         logger.exception("Failed to load balances via REST_API_CI")
-        return jsonify({"success": False, "error": "Failed to load inventory data", "message": str(exc)}), 500
+        return _json_response({"success": False, "error": "Failed to load inventory data", "message": str(exc)}, 500)
 
 
 @api_v1.post("/order")
 def create_order():
-    global order_amount, is_cancelled, last_order_created_at, cashin_ack_received, last_cashin_received_baht
     try:
-        is_cancelled = False
-        cashin_ack_received = False
-        last_cashin_received_baht = 0.0
-
         payload = request.get_json(silent=True) or {}
         amount_value = payload.get("amount", 0)
         try:
@@ -381,84 +614,99 @@ def create_order():
         except (TypeError, ValueError):
             order_amount = 0.0
 
-        # mark order start time
-        last_order_created_at = time.time()
+        # reset state and mark order start time
+        with _state_lock:
+            _state.amount = order_amount
+            _state.cancelled = False
+            _state.created_at = time.time()
+            _state.cashin_ack = False
+            _state.cashin_baht = 0.0
 
         # Submit upstream /cashin asynchronously and return immediately
         _submit_cashin_async(order_amount)
 
-        # Load generic template and respond as processing
-        response = _load_generic_template("create-sale-success.json")
-        response["data"]["amount"] = int(order_amount)
-        response["data"]["status"] = "processing"
-        return jsonify(response), 200
+        # Respond with generic template shape as processing
+        return _json_response(_create_sale_response(int(order_amount), "processing"))
     except Exception as exc:  # pragma: no cover
         logger.exception("Failed to create sale")
-        return jsonify({"success": False, "error": "Failed to create sale", "message": str(exc)}), 500
+        return _json_response({"success": False, "error": "Failed to create sale", "message": str(exc)}, 500)
 
 
 @api_v1.get("/status")
 def get_status():
-    global order_amount, is_cancelled, cashin_ack_received, last_cashin_received_baht
     try:
-        # Fetch latest snapshot via HTTP only
-        latest_payload = None
-        try:
-            resp = requests.get(f"{UPSTREAM_BASE}/socket/latest", timeout=HTTP_TIMEOUT_SECONDS)
-            if resp.ok:
-                latest_payload = resp.json()
-        except Exception as exc:
-            logger.warning("Upstream /socket/latest failed: %s", exc)
+        # Read latest snapshot kept fresh by the background refresher
+        _ensure_latest_refresher()
+        latest_payload = _get_latest_snapshot()
+
+        # Snapshot state and consume one-shot flags atomically
+        with _state_lock:
+            state = replace(_state)
+            if state.cancelled:
+                # clear state after reporting cancelled
+                _state.cancelled = False
+                _state.cashin_ack = False
+                _state.cashin_baht = 0.0
+            elif state.cashin_ack:
+                # one-shot success, clear after reporting
+                _state.cashin_ack = False
 
-        # Load generic status template
-        shaped = _load_generic_template("get-by-id-success.json")
-        inserted_amount = _get_inserted_amount_from_latest(latest_payload)
-        # amount should be the original order amount from /order, not from socket
-        shaped["data"]["amount"] = int(order_amount)
-        # cashin should reflect accepted amount from /cashin response; fallback to socket/latest
-        cashin_value = int(last_cashin_received_baht) if last_cashin_received_baht else int(inserted_amount)
-        shaped["data"]["cashin"] = cashin_value
-
-        if is_cancelled:
-            shaped["data"]["status"] = "cancelled"
-            shaped["data"]["cashin"] = 0
-            # clear state after reporting cancelled
-            is_cancelled = False
-            cashin_ack_received = False
-            last_cashin_received_baht = 0.0
+        if state.cancelled:
+            status, cashin_value = "cancelled", 0
         else:
-            if cashin_ack_received:
-                shaped["data"]["status"] = "succeeded"
-                # one-shot success, clear after reporting
-                cashin_ack_received = False
+            status = "succeeded" if state.cashin_ack else "processing"
+            # cashin should reflect accepted amount from /cashin response; fallback to socket/latest
+            if state.cashin_baht:
+                cashin_value = int(state.cashin_baht)
             else:
-                shaped["data"]["status"] = "processing"
+                cashin_value = int(_get_inserted_amount_from_latest(latest_payload))
 
-        return jsonify(shaped)
+        # amount should be the original order amount from /order, not from socket
+        return _json_response(_status_response(int(state.amount), cashin_value, status))
     except Exception as exc:  # pragma: no cover
         logger.exception("Failed to get status")
-        return jsonify({"success": False, "error": "Failed to load status", "message": str(exc)}), 500
+        return _json_response({"success": False, "error": "Failed to load status", "message": str(exc)}, 500)
 
 
 @api_v1.patch("/cancel/<string:sale_id>")
 @api_v1.patch("/cancel", defaults={"sale_id": None})
 def cancel_order(sale_id: Optional[str] = None):
-    global is_cancelled
     try:
         # Call upstream cancel (side-effect only)
         try:
-            _ = requests.get(f"{UPSTREAM_BASE}/cashin_cancel", timeout=HTTP_TIMEOUT_SECONDS)
+            _ = _SESSION.get(_URL_CANCEL, timeout=HTTP_TIMEOUT_SECONDS)
         except Exception as exc:
             logger.warning("Upstream /cashin_cancel failed: %s", exc)
 
-        is_cancelled = True
-        response = _load_generic_template("cancel-sale-success.json")
-        return jsonify(response)
+        with _state_lock:
+            _state.cancelled = True
+        return _json_response(_cancel_response())
     except Exception as exc:  # pragma: no cover
         logger.exception("Failed to cancel sale")
-        return jsonify({"success": False, "error": "Failed to cancel sale", "message": str(exc)}), 500
+        return _json_response({"success": False, "error": "Failed to cancel sale", "message": str(exc)}, 500)
+
+
+def create_app() -> Flask:
+    """Application factory.
+
+    Upstream session, templates and order state live at module level and are shared
+    by every app built here. Order state is in-process, so serve with a single
+    threaded worker, e.g. ``gunicorn -k gthread -w 1 --threads 16 --keep-alive 30 app:app``.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    app.url_map.strict_slashes = False
+
+    app.after_request(log_response)
+    if SIMULATED_DELAY_SECONDS:
+        app.before_request(add_processing_delay)
+
+    app.add_url_rule("/", view_func=health_check, methods=["GET"])
+    # Mount API blueprint (after all routes are defined)
+    app.register_blueprint(api_v1)
+    return app
 
 
-# Mount API blueprint (after all routes are defined)
-app.register_blueprint(api_v1)
+# Module-level app kept for `from pospos_api_sale import app` and gunicorn `app:app`
+app = create_app()
 